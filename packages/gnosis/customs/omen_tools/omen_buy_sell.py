@@ -22,14 +22,21 @@ This module implements a tool which prepares a transaction for the transaction s
 Please note that the gnosis safe parameters are missing from the payload, e.g., `safe_tx_hash`, `safe_tx_gas`, etc.
 """
 import functools
-import traceback
+import json
+import logging
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, Optional, Tuple, Callable
 
 import openai
-from langchain_core.output_parsers import PydanticOutputParser
+from eth_typing import ChecksumAddress
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
 from openai import OpenAI
+from prediction_market_agent_tooling.gtypes import ABI
 from prediction_market_agent_tooling.markets.agent_market import AgentMarket
 from prediction_market_agent_tooling.markets.omen.data_models import (
     OMEN_TRUE_OUTCOME,
@@ -41,17 +48,20 @@ from prediction_market_agent_tooling.markets.omen.omen_contracts import (
     OmenCollateralTokenContract,
     OmenConditionalTokenContract,
 )
-from prediction_market_agent_tooling.tools.web3_utils import (
-    prepare_tx,
-    add_fraction,
-)
+from prediction_market_agent_tooling.tools.web3_utils import add_fraction
 from pydantic import BaseModel
+from requests import Session
+from requests.adapters import HTTPAdapter
 from web3 import Web3
-from web3.types import TxParams
+from web3.contract import Contract
+from web3.types import Nonce, TxParams, Wei
+
+logger = logging.getLogger(__name__)
 
 MechResponse = Tuple[str, Optional[str], Optional[Dict[str, Any]], Any, Any]
 
 ENGINE = "gpt-3.5-turbo"
+PARAMS_ENGINE = "gpt-4o-mini"
 MAX_TOKENS = 500
 TEMPERATURE = 0.7
 
@@ -65,11 +75,99 @@ Do not use any functions.
 [USER_PROMPT]
 {user_prompt}
 
-Follow the formatting instructions below for producing an output in the correct format.
-{format_instructions}
+Respond only with a JSON object of the following format, without any other text:
+{{
+    "sender": "<the address of the sender, as a string>",
+    "market_id": "<the id of the market, as a string>",
+    "outcome": <true for buying or selling "yes" tokens, false for "no" tokens>,
+    "amount_to_buy": <the amount of xDAI to buy or sell tokens for, as a number>
+}}
 """
 
-client: Optional[OpenAI] = None
+# Patterns used to extract the parameters without the LLM, for well-formed prompts, e.g.,
+# "The sender 0x... wants to buy 1 yes Tokens from market 0x...".
+# The addresses must directly follow their label, and the amount must directly follow
+# the buy or sell verb, or be given in xDAI, without digit group separators.
+# Anything else is left to the LLM.
+SENDER_PATTERN = re.compile(
+    r"\bsender(?:\s+address)?(?:\s*(?:is|:|=))?\s*\b(0x[a-fA-F0-9]{40})\b", re.I
+)
+MARKET_ID_PATTERN = re.compile(
+    r"\bmarket(?:\s+(?:id|address))?(?:\s*(?:is|:|=))?\s*\b(0x[a-fA-F0-9]{40})\b",
+    re.I,
+)
+OUTCOME_PATTERN = re.compile(r"\b(yes|no|true|false)\b", re.I)
+AMOUNT_PATTERN = re.compile(
+    r"\b(?:buy|sell)\s+(\d+(?:\.\d+)?)(?![\w.,])"
+    r"|(?<![\w.,-])(\d+(?:\.\d+)?)\s*(?:w?xdai|eth)\b",
+    re.I,
+)
+TRUE_OUTCOMES = ("yes", "true")
+PARAMS_CACHE_SIZE = 256
+MARKETS_CACHE_SIZE = 256
+CONTRACTS_CACHE_SIZE = 64
+OPENAI_CLIENTS_CACHE_SIZE = 8
+RPC_POOL_SIZE = 10
+RPC_TIMEOUT = 10
+INITIAL_RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+# the AMM reserves change slowly, so a few seconds of staleness is fine given the 1% slippage
+CALC_BUY_AMOUNT_TTL = 5.0
+CALC_BUY_AMOUNT_CACHE_SIZE = 1024
+MULTICALL3_ADDRESS = Web3.to_checksum_address(
+    "0xcA11bde05977b3631167028862bE2a173976CA11"
+)
+MULTICALL3_ABI = json.dumps(
+    [
+        {
+            "inputs": [
+                {
+                    "components": [
+                        {
+                            "internalType": "address",
+                            "name": "target",
+                            "type": "address",
+                        },
+                        {
+                            "internalType": "bool",
+                            "name": "allowFailure",
+                            "type": "bool",
+                        },
+                        {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                    ],
+                    "internalType": "struct Multicall3.Call3[]",
+                    "name": "calls",
+                    "type": "tuple[]",
+                }
+            ],
+            "name": "aggregate3",
+            "outputs": [
+                {
+                    "components": [
+                        {"internalType": "bool", "name": "success", "type": "bool"},
+                        {
+                            "internalType": "bytes",
+                            "name": "returnData",
+                            "type": "bytes",
+                        },
+                    ],
+                    "internalType": "struct Multicall3.Result[]",
+                    "name": "returnData",
+                    "type": "tuple[]",
+                }
+            ],
+            "stateMutability": "payable",
+            "type": "function",
+        }
+    ]
+)
+
+# the contracts have fixed addresses and abis, there is no need to re-create them per request
+COLLATERAL_TOKEN_CONTRACT = OmenCollateralTokenContract()
+CONDITIONAL_TOKENS_CONTRACT = OmenConditionalTokenContract()
+
+# maps (market address, amount in wei, outcome index) to (expiry, expected shares)
+CALC_BUY_AMOUNT_CACHE: Dict[Tuple[str, int, int], Tuple[float, int]] = {}
 
 
 class BuyOrSell(BaseModel):
@@ -79,126 +177,301 @@ class BuyOrSell(BaseModel):
     amount_to_buy: float
 
 
-def build_params_from_prompt(user_prompt: str) -> BuyOrSell:
-    model = ChatOpenAI(temperature=0, api_key=client.api_key)
-    parser = PydanticOutputParser(pydantic_object=BuyOrSell)
-    prompt = PromptTemplate(
-        template=BUY_OR_SELL_TOKENS_PROMPT,
-        input_variables=["user_prompt"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
+def parse_params_from_prompt(user_prompt: str) -> Optional[BuyOrSell]:
+    """Deterministically parse the params from the prompt, returns `None` if the prompt is ambiguous."""
+    try:
+        raw_params = json.loads(user_prompt)
+        if (
+            isinstance(raw_params, dict)
+            and raw_params.keys() >= BuyOrSell.model_fields.keys()
+        ):
+            return BuyOrSell(**raw_params)
+    except ValueError:
+        pass
+
+    # the addresses are compared case-insensitively, as they may be checksummed
+    senders = {sender.lower(): sender for sender in SENDER_PATTERN.findall(user_prompt)}
+    market_ids = {
+        market_id.lower(): market_id
+        for market_id in MARKET_ID_PATTERN.findall(user_prompt)
+    }
+    outcomes = {
+        outcome.lower() in TRUE_OUTCOMES
+        for outcome in OUTCOME_PATTERN.findall(user_prompt)
+    }
+    amounts = {
+        float(verb_amount or unit_amount)
+        for verb_amount, unit_amount in AMOUNT_PATTERN.findall(user_prompt)
+    }
+    if any(len(values) != 1 for values in (senders, market_ids, outcomes, amounts)):
+        return None
+
+    sender_key, sender = senders.popitem()
+    market_id_key, market_id = market_ids.popitem()
+    if sender_key == market_id_key:
+        # the market can't be the sender, the prompt is not what the patterns expect
+        return None
+
+    return BuyOrSell(
+        sender=sender,
+        market_id=market_id,
+        outcome=outcomes.pop(),
+        amount_to_buy=amounts.pop(),
     )
-    chain = prompt | model | parser
-    return chain.invoke({"user_prompt": user_prompt})
 
 
-class OpenAIClientManager:
-    """Client context manager for OpenAI."""
+# the prompt only depends on constants, so it is built once
+PARAMS_PROMPT = PromptTemplate(
+    template=BUY_OR_SELL_TOKENS_PROMPT,
+    input_variables=["user_prompt"],
+)
+
 
-    def __init__(self, api_key: str):
-        self.api_key = api_key
+@functools.lru_cache(maxsize=OPENAI_CLIENTS_CACHE_SIZE)
+def get_openai(api_key: str) -> OpenAI:
+    """Get the OpenAI client for the given key, reusing its connection pool across requests."""
+    return OpenAI(api_key=api_key)
+
+
+@functools.lru_cache(maxsize=OPENAI_CLIENTS_CACHE_SIZE)
+def get_params_chain(api_key: str) -> Runnable:
+    # use the json mode, so that the response can be parsed directly into the params
+    model = ChatOpenAI(
+        temperature=0,
+        model=PARAMS_ENGINE,
+        api_key=api_key,
+        client=get_openai(api_key).chat.completions,
+        model_kwargs={"response_format": {"type": "json_object"}},
+    )
+    return PARAMS_PROMPT | model
 
-    def __enter__(self) -> OpenAI:
-        global client
-        if client is None:
-            client = OpenAI(api_key=self.api_key)
-        return client
 
-    def __exit__(self, exc_type, exc_value, traceback) -> None:
-        global client
-        if client is not None:
-            client.close()
-            client = None
+@functools.lru_cache(maxsize=PARAMS_CACHE_SIZE)
+def build_params_from_prompt(user_prompt: str, api_key: str) -> BuyOrSell:
+    params = parse_params_from_prompt(user_prompt)
+    if params is not None:
+        return params
+
+    chain = get_params_chain(api_key)
+    response = chain.invoke({"user_prompt": user_prompt})
+    return BuyOrSell.model_validate_json(response.content)
+
+
+@functools.lru_cache(maxsize=CONTRACTS_CACHE_SIZE)
+def get_contract(w3: Web3, address: ChecksumAddress, abi: ABI) -> Contract:
+    """Get the web3 contract, so that its abi is only parsed once."""
+    return w3.eth.contract(address=address, abi=abi)
+
+
+def prepare_contract_tx(  # pylint: disable=too-many-arguments
+    w3: Web3,
+    contract_address: ChecksumAddress,
+    contract_abi: ABI,
+    from_address: ChecksumAddress,
+    function_name: str,
+    function_params: list[Any],
+    nonce: Nonce,
+    tx_params: Optional[TxParams] = None,
+) -> TxParams:
+    """Same as `prepare_tx`, but reuses the contract objects and takes the nonce explicitly."""
+    contract = get_contract(w3, contract_address, contract_abi)
+    tx_params_new = TxParams(**(tx_params or {}))
+    tx_params_new["from"] = from_address
+    tx_params_new["nonce"] = nonce
+    function_call = contract.functions[function_name](*function_params)
+    return function_call.build_transaction(tx_params_new)
+
+
+def get_next_nonce(w3: Web3, address: ChecksumAddress) -> Nonce:
+    """Get the next nonce of the address, taking into account its pending txs."""
+    return w3.eth.get_transaction_count(address, "pending")
 
 
 def build_approval_for_all_tx_params(
-    buy_or_sell: BuyOrSell, market: AgentMarket, w3: Web3
+    from_address: ChecksumAddress, nonce: Nonce, market: AgentMarket, w3: Web3
 ) -> TxParams:
     """
     # Approve the market maker to withdraw our collateral token.
     """
-    from_address_checksummed = Web3.to_checksum_address(buy_or_sell.sender)
     market_contract: OmenFixedProductMarketMakerContract = market.get_contract()
-    conditional_tokens_contract = OmenConditionalTokenContract()
+    conditional_tokens_contract = CONDITIONAL_TOKENS_CONTRACT
 
-    tx_params_approve_all = prepare_tx(
-        web3=w3,
+    tx_params_approve_all = prepare_contract_tx(
+        w3=w3,
         contract_address=conditional_tokens_contract.address,
         contract_abi=conditional_tokens_contract.abi,
-        from_address=from_address_checksummed,
+        from_address=from_address,
         function_name="setApprovalForAll",
         function_params=[
             market_contract.address,
             True,  # approve=True
         ],
+        nonce=nonce,
     )
     return tx_params_approve_all
 
 
 def build_approval_tx_params(
-    buy_or_sell: BuyOrSell, market: AgentMarket, w3: Web3
+    from_address: ChecksumAddress,
+    amount_wei: Wei,
+    nonce: Nonce,
+    market: AgentMarket,
+    w3: Web3,
 ) -> TxParams:
     """
     # Approve the market maker to withdraw our collateral token.
     """
-    from_address_checksummed = Web3.to_checksum_address(buy_or_sell.sender)
-    amount_wei = Web3.to_wei(buy_or_sell.amount_to_buy, "ether")
-
     market_contract: OmenFixedProductMarketMakerContract = market.get_contract()
-    collateral_token_contract = OmenCollateralTokenContract()
+    collateral_token_contract = COLLATERAL_TOKEN_CONTRACT
 
-    tx_params_approve = prepare_tx(
-        web3=w3,
+    tx_params_approve = prepare_contract_tx(
+        w3=w3,
         contract_address=collateral_token_contract.address,
         contract_abi=collateral_token_contract.abi,
-        from_address=from_address_checksummed,
+        from_address=from_address,
         function_name="approve",
         function_params=[
             market_contract.address,
             amount_wei,
         ],
+        nonce=nonce,
     )
     return tx_params_approve
 
 
-def build_buy_tokens_tx_params(
-    buy_or_sell: BuyOrSell, market: AgentMarket, w3: Web3
-) -> TxParams:
-    from_address_checksummed = Web3.to_checksum_address(buy_or_sell.sender)
-    amount_wei = Web3.to_wei(buy_or_sell.amount_to_buy, "ether")
+def calc_buy_amount(
+    market_contract: OmenFixedProductMarketMakerContract,
+    amount_wei: Wei,
+    outcome_index: int,
+    w3: Web3,
+) -> int:
+    """Calculate the amount of shares to be bought, reusing recent results for the same trade."""
+    now = time.monotonic()
+    key = (market_contract.address, amount_wei, outcome_index)
+    cached = CALC_BUY_AMOUNT_CACHE.get(key, None)
+    if cached is not None and now < cached[0]:
+        return cached[1]
+
+    expected_shares = market_contract.calcBuyAmount(amount_wei, outcome_index, web3=w3)
+    cache_buy_amount(key, expected_shares)
+    return expected_shares
+
+
+def cache_buy_amount(key: Tuple[str, int, int], expected_shares: int) -> None:
+    """Cache the amount of shares to be bought for the given trade."""
+    now = time.monotonic()
+    if len(CALC_BUY_AMOUNT_CACHE) >= CALC_BUY_AMOUNT_CACHE_SIZE:
+        # drop the expired entries, or the oldest one if none has expired yet
+        expired = [
+            k for k, (expiry, _) in CALC_BUY_AMOUNT_CACHE.items() if expiry <= now
+        ]
+        for expired_key in expired or [next(iter(CALC_BUY_AMOUNT_CACHE))]:
+            CALC_BUY_AMOUNT_CACHE.pop(expired_key, None)
+    CALC_BUY_AMOUNT_CACHE[key] = (now + CALC_BUY_AMOUNT_TTL, expected_shares)
+
+
+def aggregate_calls(
+    w3: Web3, calls: list[Tuple[Contract, str, list[Any]]]
+) -> list[Any]:
+    """Perform multiple view calls in a single rpc round-trip, using Multicall3."""
+    multicall = get_contract(w3, MULTICALL3_ADDRESS, MULTICALL3_ABI)
+    encoded_calls = [
+        (contract.address, False, contract.encodeABI(fn_name=function_name, args=args))
+        for contract, function_name, args in calls
+    ]
+    results = multicall.functions.aggregate3(encoded_calls).call()
+
+    outputs = []
+    for (contract, function_name, _), (_, return_data) in zip(calls, results):
+        function_abi = contract.get_function_by_name(function_name).abi
+        output_types = [output["type"] for output in function_abi["outputs"]]
+        decoded = w3.codec.decode(output_types, return_data)
+        outputs.append(decoded[0] if len(decoded) == 1 else decoded)
+    return outputs
+
+
+def check_balance_sufficient_for_buying_token(
+    from_address: ChecksumAddress,
+    amount_wei: Wei,
+    outcome: bool,
+    market: AgentMarket,
+    w3: Web3,
+) -> bool:
+    """Check if the sender has enough collateral tokens to buy the outcome tokens."""
+    market_contract: OmenFixedProductMarketMakerContract = market.get_contract()
+    collateral_token_contract = COLLATERAL_TOKEN_CONTRACT
+    outcome_str = OMEN_TRUE_OUTCOME if outcome else OMEN_FALSE_OUTCOME
+    outcome_index: int = market.get_outcome_index(outcome_str)
 
+    # the shares are needed to build the buy tx anyway, so they are fetched along with the balance
+    balance, expected_shares = aggregate_calls(
+        w3,
+        [
+            (
+                get_contract(
+                    w3, collateral_token_contract.address, collateral_token_contract.abi
+                ),
+                "balanceOf",
+                [from_address],
+            ),
+            (
+                get_contract(w3, market_contract.address, market_contract.abi),
+                "calcBuyAmount",
+                [amount_wei, outcome_index],
+            ),
+        ],
+    )
+    cache_buy_amount(
+        (market_contract.address, amount_wei, outcome_index), expected_shares
+    )
+    return balance >= amount_wei
+
+
+def build_buy_tokens_tx_params(  # pylint: disable=too-many-arguments
+    from_address: ChecksumAddress,
+    amount_wei: Wei,
+    outcome: bool,
+    nonce: Nonce,
+    market: AgentMarket,
+    w3: Web3,
+) -> TxParams:
     market_contract: OmenFixedProductMarketMakerContract = market.get_contract()
 
     # Get the index of the outcome we want to buy.
-    outcome_str = OMEN_TRUE_OUTCOME if buy_or_sell.outcome else OMEN_FALSE_OUTCOME
+    outcome_str = OMEN_TRUE_OUTCOME if outcome else OMEN_FALSE_OUTCOME
     outcome_index: int = market.get_outcome_index(outcome_str)
 
     # Allow 1% slippage.
-    expected_shares = market_contract.calcBuyAmount(amount_wei, outcome_index, web3=w3)
+    expected_shares = calc_buy_amount(market_contract, amount_wei, outcome_index, w3)
 
     # Buy shares using the deposited xDai in the collateral token.
-    tx_params_buy = prepare_tx(
-        web3=w3,
+    tx_params_buy = prepare_contract_tx(
+        w3=w3,
         contract_address=Web3.to_checksum_address(market_contract.address),
         contract_abi=market_contract.abi,
-        from_address=from_address_checksummed,
+        from_address=from_address,
         function_name="buy",
         function_params=[
             amount_wei,
             outcome_index,
             expected_shares,
         ],
+        nonce=nonce,
         tx_params={"gas": "21000"},
     )
     return tx_params_buy
 
 
-def build_sell_tokens_tx_params(
-    buy_or_sell: BuyOrSell, market: AgentMarket, w3: Web3
+def build_sell_tokens_tx_params(  # pylint: disable=too-many-arguments
+    from_address: ChecksumAddress,
+    amount_wei: Wei,
+    outcome: bool,
+    nonce: Nonce,
+    market: AgentMarket,
+    w3: Web3,
 ) -> TxParams:
-    from_address_checksummed = Web3.to_checksum_address(buy_or_sell.sender)
-    amount_wei = Web3.to_wei(buy_or_sell.amount_to_buy, "ether")
     market_contract: OmenFixedProductMarketMakerContract = market.get_contract()
-    conditional_token_contract = OmenConditionalTokenContract()
+    conditional_token_contract = CONDITIONAL_TOKENS_CONTRACT
 
     # Verify, that markets uses conditional tokens that we expect.
     if market_contract.conditionalTokens(web3=w3) != conditional_token_contract.address:
@@ -207,7 +480,7 @@ def build_sell_tokens_tx_params(
         )
 
     # Get the index of the outcome we want to sell.
-    outcome_str = OMEN_TRUE_OUTCOME if buy_or_sell.outcome else OMEN_FALSE_OUTCOME
+    outcome_str = OMEN_TRUE_OUTCOME if outcome else OMEN_FALSE_OUTCOME
     outcome_index: int = market.get_outcome_index(outcome_str)
 
     # Calculate the amount of shares we will sell for the given selling amount of xdai.
@@ -218,50 +491,92 @@ def build_sell_tokens_tx_params(
     max_outcome_tokens_to_sell = add_fraction(max_outcome_tokens_to_sell, 0.01)
 
     # Sell the shares.
-    tx_params_sell = prepare_tx(
-        web3=w3,
+    tx_params_sell = prepare_contract_tx(
+        w3=w3,
         contract_address=market_contract.address,
         contract_abi=market_contract.abi,
-        from_address=from_address_checksummed,
+        from_address=from_address,
         function_name="sell",
         function_params=[
             amount_wei,
             outcome_index,
             max_outcome_tokens_to_sell,
         ],
+        nonce=nonce,
         tx_params={"gas": 210000},
     )
 
     return tx_params_sell
 
 
-def fetch_params_from_prompt(prompt: str):
-    buy_params = build_params_from_prompt(user_prompt=prompt)
+@functools.lru_cache(maxsize=MARKETS_CACHE_SIZE)
+def get_market(market_id: str) -> AgentMarket:
+    return OmenAgentMarket.get_binary_market(market_id)
+
+
+def fetch_params_from_prompt(prompt: str, api_key: str):
+    buy_params = build_params_from_prompt(user_prompt=prompt, api_key=api_key)
     # Calculate the amount of shares we will get for the given investment amount.
-    market: AgentMarket = OmenAgentMarket.get_binary_market(buy_params.market_id)
+    market: AgentMarket = get_market(buy_params.market_id)
     return buy_params, market
 
 
+def build_tx_params_concurrently(*builders: Callable[[], TxParams]) -> list[TxParams]:
+    """Run the tx params builders concurrently, as each of them waits on its own RPC calls."""
+    with ThreadPoolExecutor(max_workers=len(builders)) as executor:
+        futures = [executor.submit(builder) for builder in builders]
+        # keep the order of the builders, as the transactions need to be executed in that order
+        return [future.result() for future in futures]
+
+
 def build_buy_tx(
-    prompt: str, rpc_url: str
+    prompt: str, rpc_url: str, api_key: str, check_balance: bool = True
 ) -> Tuple[str, Optional[str], Optional[Dict[str, Any]], Any]:
     """Builds buy transaction request."""
 
     try:
-        buy_params, market = fetch_params_from_prompt(prompt)
+        buy_params, market = fetch_params_from_prompt(prompt, api_key)
         w3 = get_web3(rpc_url)
 
-        tx_params_approve = build_approval_tx_params(
-            buy_or_sell=buy_params, market=market, w3=w3
-        )
-        tx_params_buy = build_buy_tokens_tx_params(
-            buy_or_sell=buy_params, market=market, w3=w3
+        from_address = Web3.to_checksum_address(buy_params.sender)
+        amount_wei = Web3.to_wei(buy_params.amount_to_buy, "ether")
+        # fail fast before estimating the gas and fetching the nonce for both txs
+        if check_balance and not check_balance_sufficient_for_buying_token(
+            from_address, amount_wei, buy_params.outcome, market, w3
+        ):
+            return error_response(
+                f"Insufficient wxDAI balance of {from_address} for buying tokens with {amount_wei} wei."
+            )
+
+        # the txs are executed one after the other, so their nonces are consecutive
+        nonce = get_next_nonce(w3, from_address)
+        tx_params = build_tx_params_concurrently(
+            functools.partial(
+                build_approval_tx_params,
+                from_address=from_address,
+                amount_wei=amount_wei,
+                nonce=nonce,
+                market=market,
+                w3=w3,
+            ),
+            functools.partial(
+                build_buy_tokens_tx_params,
+                from_address=from_address,
+                amount_wei=amount_wei,
+                outcome=buy_params.outcome,
+                nonce=Nonce(nonce + 1),
+                market=market,
+                w3=w3,
+            ),
         )
 
-        return build_return_from_tx_params([tx_params_approve, tx_params_buy], prompt)
+        return build_return_from_tx_params(tx_params, prompt)
 
+    except openai.RateLimitError:
+        # let the key rotation retry with another key
+        raise
     except Exception as e:
-        traceback.print_exception(e)
+        logger.exception("Failed to build the buy transaction.")
         return f"exception occurred - {e}", "", None, None
 
 
@@ -276,36 +591,72 @@ def build_return_from_tx_params(
     return "", prompt, transaction_dict, None
 
 
+@functools.lru_cache(maxsize=None)
 def get_web3(gnosis_rpc_url: str) -> Web3:
-    return Web3(Web3.HTTPProvider(gnosis_rpc_url))
+    # reuse the same session for all the requests to the rpc, so that the connections are kept alive
+    session = Session()
+    adapter = HTTPAdapter(pool_connections=RPC_POOL_SIZE, pool_maxsize=RPC_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    provider = Web3.HTTPProvider(
+        gnosis_rpc_url,
+        request_kwargs={"timeout": RPC_TIMEOUT},
+        session=session,
+    )
+    return Web3(provider)
 
 
 def build_sell_tx(
-    prompt: str, rpc_url: str
+    prompt: str, rpc_url: str, api_key: str
 ) -> Tuple[str, Optional[str], Optional[Dict[str, Any]], Any]:
     """Builds sell transaction request."""
 
     try:
-        sell_params, market = fetch_params_from_prompt(prompt)
+        sell_params, market = fetch_params_from_prompt(prompt, api_key)
         w3 = get_web3(rpc_url)
 
-        tx_params_approve_all = build_approval_for_all_tx_params(
-            buy_or_sell=sell_params, market=market, w3=w3
+        from_address = Web3.to_checksum_address(sell_params.sender)
+        amount_wei = Web3.to_wei(sell_params.amount_to_buy, "ether")
+
+        # the txs are executed one after the other, so their nonces are consecutive
+        nonce = get_next_nonce(w3, from_address)
+        tx_params = build_tx_params_concurrently(
+            functools.partial(
+                build_approval_for_all_tx_params,
+                from_address=from_address,
+                nonce=nonce,
+                market=market,
+                w3=w3,
+            ),
+            functools.partial(
+                build_sell_tokens_tx_params,
+                from_address=from_address,
+                amount_wei=amount_wei,
+                outcome=sell_params.outcome,
+                nonce=Nonce(nonce + 1),
+                market=market,
+                w3=w3,
+            ),
         )
 
-        tx_params_sell = build_sell_tokens_tx_params(
-            buy_or_sell=sell_params, market=market, w3=w3
-        )
-
-        return build_return_from_tx_params(
-            [tx_params_approve_all, tx_params_sell], prompt
-        )
+        return build_return_from_tx_params(tx_params, prompt)
 
+    except openai.RateLimitError:
+        # let the key rotation retry with another key
+        raise
     except Exception as e:
-        traceback.print_exception(e)
+        logger.exception("Failed to build the sell transaction.")
         return f"exception occurred - {e}", "", None, None
 
 
+def get_retry_delay(error: openai.RateLimitError, default: float) -> float:
+    """Get the delay suggested by the `Retry-After` header, if any."""
+    try:
+        return min(float(error.response.headers["retry-after"]), MAX_RETRY_DELAY)
+    except (AttributeError, KeyError, ValueError):
+        return default
+
+
 def with_key_rotation(func: Callable):
     @functools.wraps(func)
     def wrapper(*args, **kwargs) -> MechResponse:
@@ -313,9 +664,9 @@ def with_key_rotation(func: Callable):
         # although it is not explicitly typed as such
         api_keys = kwargs["api_keys"]
         retries_left: Dict[str, int] = api_keys.max_retries()
+        delay = INITIAL_RETRY_DELAY
 
-        def execute() -> MechResponse:
-            """Retry the function with a new key."""
+        while True:
             try:
                 result = func(*args, **kwargs)
                 return result + (api_keys,)
@@ -325,15 +676,15 @@ def with_key_rotation(func: Callable):
                     raise e
                 retries_left["openai"] -= 1
                 retries_left["openrouter"] -= 1
+                # back off before retrying, to avoid hitting the rate limit again right away
+                wait = get_retry_delay(e, delay)
+                time.sleep(wait + random.random() * wait)  # nosec
+                delay = min(delay * 2, MAX_RETRY_DELAY)
                 api_keys.rotate("openai")
                 api_keys.rotate("openrouter")
-                return execute()
             except Exception as e:
                 return str(e), "", None, None, api_keys
 
-        mech_response = execute()
-        return mech_response
-
     return wrapper
 
 
@@ -367,27 +718,27 @@ ALLOWED_TOOLS = {
 def run(**kwargs) -> Tuple[str, Optional[str], Optional[Dict[str, Any]], Any]:
     """Run the task"""
     tool: str | None = kwargs.get("tool", None)
-
     if tool is None:
         return error_response("No tool has been specified.")
 
-    prompt: str | None = kwargs.get("prompt", None)
-    if prompt is None:
-        return error_response("No prompt has been given.")
-
     transaction_builder = ALLOWED_TOOLS.get(tool)
     if transaction_builder is None:
         return error_response(
             f"Tool {tool!r} is not in supported tools: {tuple(ALLOWED_TOOLS.keys())}."
         )
 
-    api_key: str | None = kwargs.get("api_keys", {}).get("openai", None)
+    prompt: str | None = kwargs.get("prompt", None)
+    if prompt is None:
+        return error_response("No prompt has been given.")
+
+    api_keys = kwargs.get("api_keys", {})
+    api_key: str | None = api_keys.get("openai", None)
     if api_key is None:
         return error_response("No api key has been given.")
 
-    gnosis_rpc_url: str | None = kwargs.get("api_keys", {}).get("gnosis_rpc_url", None)
+    gnosis_rpc_url: str | None = api_keys.get("gnosis_rpc_url", None)
     if gnosis_rpc_url is None:
         return error_response("No gnosis rpc url has been given.")
 
-    with OpenAIClientManager(api_key):
-        return transaction_builder(prompt, gnosis_rpc_url)
+    # the openai clients are cached per key, so there is no client to open or close per request
+    return transaction_builder(prompt, gnosis_rpc_url, api_key)
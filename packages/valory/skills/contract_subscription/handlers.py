@@ -22,6 +22,7 @@
 
 import json
 import time
+from collections import deque
 from typing import Any
 
 from web3 import Web3
@@ -58,7 +59,7 @@ class WebSocketHandler(BaseWebSocketHandler):
         """Implement the setup."""
         super().setup()
 
-        self.context.shared_state[JOB_QUEUE] = []
+        self.context.shared_state[JOB_QUEUE] = deque()
         self.context.shared_state[DISCONNECTION_POINT] = None
         self._last_processed_block = None
 
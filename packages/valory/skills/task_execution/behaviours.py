@@ -18,20 +18,25 @@
 # ------------------------------------------------------------------------------
 
 """This package contains the implementation of ."""
+import functools
+import heapq
 import json
+import multiprocessing
 import threading
 import time
-from asyncio import Future
-from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from concurrent.futures.process import BrokenProcessPool
-from typing import Any, Callable, Dict, List, Optional, Tuple, cast
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple, cast
 
 from aea.helpers.cid import to_v1
 from aea.mail.base import EnvelopeContext
 from aea.protocols.base import Message
 from aea.protocols.dialogue.base import Dialogue
 from aea.skills.behaviours import SimpleBehaviour
-from eth_abi import encode
+from eth_abi.encoding import TupleEncoder
+from eth_abi.registry import registry
 
 from packages.valory.connections.ipfs.connection import IpfsDialogues
 from packages.valory.connections.ipfs.connection import PUBLIC_ID as IPFS_CONNECTION_ID
@@ -49,7 +54,7 @@ from packages.valory.protocols.ipfs import IpfsMessage
 from packages.valory.protocols.ipfs.dialogues import IpfsDialogue
 from packages.valory.protocols.ledger_api import LedgerApiMessage
 from packages.valory.skills.task_execution.handlers import LAST_SUCCESSFUL_EXECUTED_TASK
-from packages.valory.skills.task_execution.models import Params
+from packages.valory.skills.task_execution.models import ExecutingTask, Params
 from packages.valory.skills.task_execution.utils.apis import KeyChain
 from packages.valory.skills.task_execution.utils.benchmarks import TokenCounterCallback
 from packages.valory.skills.task_execution.utils.cost_calculation import (
@@ -60,7 +65,10 @@ from packages.valory.skills.task_execution.utils.ipfs import (
     get_ipfs_file_hash,
     to_multihash,
 )
-from packages.valory.skills.task_execution.utils.task import AnyToolAsTask
+from packages.valory.skills.task_execution.utils.task import (
+    AnyToolAsTask,
+    serialize_response,
+)
 
 
 PENDING_TASKS = "pending_tasks"
@@ -72,6 +80,21 @@ LEDGER_API_ADDRESS = str(LEDGER_CONNECTION_PUBLIC_ID)
 
 REORG_WINDOW = 200
 
+# encodes the (cost, multihash) task result of the mechs using dynamic pricing
+DYNAMIC_PRICING_ENCODER = TupleEncoder(
+    encoders=(registry.get_encoder("uint256"), registry.get_encoder("bytes"))
+)
+
+
+class TaskState(Enum):
+    """The state of an executing task."""
+
+    # the task is still executing, is being finalized or doesn't exist
+    PENDING = "pending"
+    READY = "ready"
+    INVALID = "invalid"
+    TIMED_OUT = "timed_out"
+
 
 class TaskExecutionBehaviour(SimpleBehaviour):
     """A class to execute tasks."""
@@ -79,36 +102,61 @@ class TaskExecutionBehaviour(SimpleBehaviour):
     def __init__(self, **kwargs: Any):
         """Initialise the agent."""
         super().__init__(**kwargs)
-        self._executor: Dict[int, ProcessPoolExecutor] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cancelled_tasks: Optional[Any] = None
+        # the task ids that are not held by any task which is queued or running in the workers
+        self._free_task_ids: Deque[int] = deque()
         self._executing_tasks: Dict[int, Dict[str, Any]] = {}
         self._tools_to_file_hash: Dict[str, str] = {}
         self._all_tools: Dict[str, Tuple[str, str, Dict[str, Any]]] = {}
-        self._inflight_tool_req: Optional[str] = None
+        self._inflight_tool_reqs: Set[str] = set()
+        self._missing_tools: Set[str] = set()
         self._done_tasks: Dict[int, Dict[str, Any]] = {}
         self._last_polling: Optional[float] = None
+        # the earliest time at which there is periodic work to do
+        self._next_deadline: float = 0
         self._invalid_requests = Dict[str, Any]
         self._keychain: Optional[KeyChain] = None
-        self._task_index: int = 0
+        # req ids of the tasks that are ready to be finalized, along with their future
+        # invalid tasks don't have a future
+        self._ready_queue: Deque[Tuple[int, Optional[Future]]] = deque()
+        # (timeout_deadline, req_id) of the executing tasks
+        self._timeout_heap: List[Tuple[float, int]] = []
+        # req ids of the tasks whose results are being stored
+        self._finalizing_reqs: Set[int] = set()
+        # the time at the start of the current act() tick
+        self._now: float = time.time()
 
     def setup(self) -> None:
         """Implement the setup."""
         self.context.logger.info("Setting up TaskExecutionBehaviour")
-        self._tools_to_file_hash = {
-            value: key
-            for key, values in self.params.file_hash_to_tools.items()
-            for value in values
-        }
+        self._tools_to_file_hash = self.params.file_hash_to_tools_inv
+        self._missing_tools = set(self._tools_to_file_hash)
         self._keychain = KeyChain(self.params.api_keys)
-        self._executor = {
-            idx: ProcessPoolExecutor(max_workers=1)
-            for idx in range(self.params.max_executing_tasks)
-        }
+        # whether each task id has been cancelled, shared with the workers for them to stop.
+        # A cancelled task may still be queued or running in the workers for a while,
+        # after it has been re-enqueued, so there are more task ids than workers
+        num_task_ids = 3 * self.params.max_executing_tasks
+        self._cancelled_tasks = multiprocessing.RawArray("b", num_task_ids)
+        self._free_task_ids = deque(range(num_task_ids))
+        self._executor = self._create_executor()
 
     def act(self) -> None:
         """Implement the act."""
+        wake_up = self.params.wake_up
+        self._now = time.time()
+        if (
+            self._now < self._next_deadline
+            and not wake_up.is_set()
+            and not self._can_dispatch_task()
+        ):
+            # nothing to do until the next deadline
+            return
+        wake_up.clear()
         self._download_tools()
         self._execute_task()
         self._check_for_new_reqs()
+        self._next_deadline = self._get_next_deadline()
 
     @property
     def done_tasks_lock(self) -> threading.Lock:
@@ -141,7 +189,7 @@ class TaskExecutionBehaviour(SimpleBehaviour):
         return self.params.timeout_limit <= self.request_id_to_num_timeouts[request_id]
 
     @property
-    def pending_tasks(self) -> List[Dict[str, Any]]:
+    def pending_tasks(self) -> Deque[Dict[str, Any]]:
         """Get pending_tasks."""
         return self.context.shared_state[PENDING_TASKS]
 
@@ -154,76 +202,104 @@ class TaskExecutionBehaviour(SimpleBehaviour):
         """If we should poll the contract."""
         if self._last_polling is None:
             return True
-        return self._last_polling + self.params.polling_interval <= time.time()
-
-    def _is_executing_task_ready(self, req_id: int) -> bool:
-        """Check if the executing task is ready."""
-        executing_task = self.params.req_id_to_data.get(req_id)
-        async_result = (
-            executing_task.get("async_result", None)
-            if executing_task is not None
-            else None
+        return self._last_polling + self.params.polling_interval <= self._now
+
+    def _can_dispatch_task(self) -> bool:
+        """If there is a pending task and a free worker to execute it."""
+        # other skills, e.g., the contract subscription, may add pending tasks without waking us up
+        params = self.params
+        return (
+            len(self.pending_tasks) > 0
+            and not params.in_flight_req
+            and len(params.req_id_to_data) < params.max_executing_tasks
         )
-        if executing_task is None or async_result is None:
-            return False
-        return async_result.done()
 
-    def _has_executing_task_timed_out(self, req_id: int) -> bool:
-        """Check if the executing task timed out."""
+    def _get_next_deadline(self) -> float:
+        """Get the earliest time at which a poll, an in flight request or a task expires."""
+        params = self.params
+        if self._last_polling is None:
+            return self._now
+        deadlines = [self._last_polling + params.polling_interval]
+        if params.in_flight_req:
+            deadlines.append(params.in_flight_req_timeout)
+        if self._timeout_heap:
+            deadlines.append(self._timeout_heap[0][0])
+        for req_id in self._finalizing_reqs:
+            executing_task = params.req_id_to_data.get(req_id)
+            if executing_task is not None:
+                deadlines.append(executing_task.finalization_timeout)
+        return min(deadlines)
+
+    def _classify(self, req_id: int) -> Tuple[TaskState, Optional[ExecutingTask]]:
+        """Get the state of an executing task, along with the task itself."""
         executing_task = self.params.req_id_to_data.get(req_id)
-        if executing_task is None:
-            return False
-        timeout_deadline = executing_task.get("timeout_deadline", None)
-        if timeout_deadline is None:
-            return False
-        return timeout_deadline <= time.time()
-
-    def _get_executing_task_result(self, req_id: int) -> Any:
-        """Get the executing task result."""
+        if executing_task is None or executing_task.pending_finalization:
+            return TaskState.PENDING, executing_task
+        if executing_task.is_invalid:
+            return TaskState.INVALID, executing_task
+        async_result = executing_task.async_result
+        if async_result is not None and async_result.done():
+            return TaskState.READY, executing_task
+        timeout_deadline = executing_task.timeout_deadline
+        if timeout_deadline is not None and timeout_deadline <= self._now:
+            return TaskState.TIMED_OUT, executing_task
+        return TaskState.PENDING, executing_task
+
+    def _get_executing_task_result(
+        self, req_id: int
+    ) -> Tuple[Optional[Tuple[Any, Any]], Optional[str]]:
+        """Get the transaction and keychain of the executing task, along with its serialized response."""
         executing_task = self.params.req_id_to_data.get(req_id)
         if executing_task is None:
             self.context.logger.error(f"Request ID {req_id} not found.")
             self.params.req_id_to_data.pop(req_id, None)
-            return None
-        if executing_task.get("is_invalid", False):
-            return None
-        try:
-            async_result = cast(Future, executing_task["async_result"])
-            return async_result.result()
-        except Exception as e:  # pylint: disable=broad-except
+            return None, None
+        if executing_task.is_invalid:
+            return None, None
+        async_result = executing_task.async_result
+        if async_result is None:
+            self.context.logger.error(f"Task for request {req_id} was not submitted.")
+            return None, None
+        if async_result.cancelled():
+            self.context.logger.error(f"Task for request {req_id} was cancelled.")
+            return None, None
+        # the future is done, so this returns the exception without re-raising it
+        exception = async_result.exception(timeout=0)
+        if exception is not None:
             self.context.logger.error(
-                "Exception raised while executing task: {}".format(str(e))
+                "Exception raised while executing task: {}".format(repr(exception))
             )
-            return None
+            return None, None
+        return async_result.result()
 
     def _download_tools(self) -> None:
         """Download tools."""
-        if self._inflight_tool_req is not None:
-            # there already is a req in flight
-            return
-        if len(self._tools_to_file_hash) == len(self._all_tools):
+        if not self._missing_tools:
             # we already have all the tools
             return
-        for tool, file_hash in self._tools_to_file_hash.items():
-            if tool in self._all_tools:
-                continue
-            # read one at a time
+        for tool in self._missing_tools - self._inflight_tool_reqs:
+            # request all the missing tools at once
+            file_hash = self._tools_to_file_hash[tool]
             ipfs_msg, message = self._build_ipfs_get_file_req(file_hash)
-            self._inflight_tool_req = tool
+            self._inflight_tool_reqs.add(tool)
             dummy_req_id = 0
-            self.send_message(ipfs_msg, message, self._handle_get_tool, dummy_req_id)
-            return
+            self.send_message(
+                ipfs_msg,
+                message,
+                functools.partial(self._handle_get_tool, tool),
+                dummy_req_id,
+            )
 
     def _handle_get_tool(
-        self, req_id: int, message: IpfsMessage, dialogue: Dialogue
+        self, tool: str, req_id: int, message: IpfsMessage, dialogue: Dialogue
     ) -> None:
         """Handle get tool response"""
         component_yaml, tool_py, callable_method = ComponentPackageLoader.load(
             message.files
         )
-        tool_req = cast(str, self._inflight_tool_req)
-        self._all_tools[tool_req] = tool_py, callable_method, component_yaml
-        self._inflight_tool_req = None
+        self._all_tools[tool] = tool_py, callable_method, component_yaml
+        self._missing_tools.discard(tool)
+        self._inflight_tool_reqs.discard(tool)
 
     def _populate_from_block(self) -> None:
         """Populate from_block"""
@@ -236,208 +312,273 @@ class TaskExecutionBehaviour(SimpleBehaviour):
             args=(),
         )
         self.params.in_flight_req = True
-        self.params.in_flight_req_timeout = time.time() + 10
+        self.params.in_flight_req_timeout = self._now + 10
         self.context.outbox.put_message(message=ledger_api_msg)
 
     def _check_for_new_reqs(self) -> None:
         """Check for new reqs."""
+        params, now = self.params, self._now
         if (
-            self.params.in_flight_req
-            and time.time() < self.params.in_flight_req_timeout
+            params.in_flight_req and now < params.in_flight_req_timeout
         ) or not self._should_poll():
             # do nothing if there is an in flight request
             # or if we should not poll yet
             return
 
-        if self.params.from_block is None:
+        if params.from_block is None:
             # set the initial from block
             self._populate_from_block()
             return
         contract_api_msg, _ = self.context.contract_dialogues.create(
             performative=ContractApiMessage.Performative.GET_STATE,
-            contract_address=self.params.agent_mech_contract_addresses[0],
+            contract_address=params.agent_mech_contract_addresses[0],
             contract_id=str(AgentMechContract.contract_id),
             callable="get_multiple_undelivered_reqs",
             kwargs=ContractApiMessage.Kwargs(
                 dict(
                     # add a reorg window to allow for block reorgs and avoid missing requests
-                    from_block=(self.params.from_block - REORG_WINDOW),
+                    from_block=(params.from_block - REORG_WINDOW),
                     chain_id=GNOSIS_CHAIN,
-                    contract_addresses=self.params.agent_mech_contract_addresses,
-                    max_block_window=self.params.max_block_window,
+                    contract_addresses=params.agent_mech_contract_addresses,
+                    max_block_window=params.max_block_window,
                 )
             ),
             counterparty=LEDGER_API_ADDRESS,
             ledger_id=self.context.default_ledger_id,
         )
-        self.params.in_flight_req = True
-        self.params.in_flight_req_timeout = time.time() + 900
+        params.in_flight_req = True
+        params.in_flight_req_timeout = now + 900
         self.context.outbox.put_message(message=contract_api_msg)
-        self._last_polling = time.time()
-
-    def _is_task_invalid(self, req_id: int) -> bool:
-        """Check if the task is invalid."""
-        executing_task = self.params.req_id_to_data.get(req_id)
-        if executing_task is None:
-            return False
-        return executing_task.get("is_invalid", False)
+        self._last_polling = now
 
     def _execute_task(self) -> None:
         """Execute tasks."""
+        params = self.params
         # check if there is a task already executing
-        if (
-            self.params.in_flight_req
-            and time.time() < self.params.in_flight_req_timeout
-        ):
+        if params.in_flight_req and self._now < params.in_flight_req_timeout:
             # there is an in flight request
             return
 
-        pending_finalization = any(
-            task_data.get("pending_finalization", False)
-            for task_data in self.params.req_id_to_data.values()
-        )
-        for task_data in self.params.req_id_to_data.values():
-            # mark tasks that are pending finalization as invalid if they have timed out
-            if task_data.get(
-                "pending_finalization", False
-            ) and time.time() > task_data.get("finalization_timeout", 0):
-                task_data["is_invalid"] = True
-                pending_finalization = False
-                break
-
-        if not pending_finalization:
-            for req_id, task_data in self.params.req_id_to_data.items():
-                if self._is_executing_task_ready(req_id) or self._is_task_invalid(
-                    req_id
-                ):
-                    task_result = self._get_executing_task_result(req_id)
-                    task_data["pending_finalization"] = True
-                    task_data["finalization_timeout"] = time.time() + 30
-                    self._handle_done_task(req_id, task_result)
-                    break
-                elif self._has_executing_task_timed_out(req_id):
-                    self._handle_timeout_task(req_id)
-                    task_data["pending_finalization"] = True
-                    task_data["finalization_timeout"] = time.time() + 30
-                    break
-
-        if len(self.pending_tasks) == 0:
+        if not self._has_pending_finalization():
+            self._finalize_next_task()
+
+        self._dispatch_next_task()
+
+    def _dispatch_next_task(self) -> None:
+        """Dispatch the next pending task, if there is a free worker."""
+        params = self.params
+        pending_tasks = self.pending_tasks
+        if len(pending_tasks) == 0:
             # not tasks (requests) to execute
             return
 
-        if len(self.params.req_id_to_data) >= len(self._executor):
-            # all executors are busy
+        req_id_to_data = params.req_id_to_data
+        if len(req_id_to_data) >= params.max_executing_tasks:
+            # all workers are busy
             return
 
-        executor_idx = self._task_index % len(self._executor)
-        self._task_index += 1
-
         # create new task
-        task_data = self.pending_tasks.pop(0)
-        task_data["executor_idx"] = executor_idx
-        self.context.logger.info(f"Preparing task with data: {task_data}")
-        self.params.req_id_to_data[task_data["requestId"]] = task_data
-        task_data_ = task_data["data"]
-        try:
-            ipfs_hash = get_ipfs_file_hash(task_data_)
-        except Exception:
-            ipfs_hash = "bafybeigatmm7mwx5bx3bbsiouaasbpgnd7a3rrxhzw7eia3w5yj6cvvfxq"
-        self.context.logger.info(
-            f"IPFS hash: {ipfs_hash} {threading.current_thread().name}"
-        )
+        logger = self.context.logger
+        task_data = pending_tasks.popleft()
+        req_id = task_data["requestId"]
+        logger.info(f"Preparing task with data: {task_data}")
+        req_id_to_data[req_id] = ExecutingTask(request=task_data)
+        # the hash is kept on the request, so that re-enqueued tasks don't decode it again
+        ipfs_hash = task_data.get("ipfs_hash", None)
+        if ipfs_hash is None:
+            try:
+                ipfs_hash = get_ipfs_file_hash(task_data["data"])
+            except Exception:
+                ipfs_hash = (
+                    "bafybeigatmm7mwx5bx3bbsiouaasbpgnd7a3rrxhzw7eia3w5yj6cvvfxq"
+                )
+            task_data["ipfs_hash"] = ipfs_hash
+        logger.info(f"IPFS hash: {ipfs_hash} {threading.current_thread().name}")
         ipfs_msg, message = self._build_ipfs_get_file_req(ipfs_hash)
-        self.send_message(
-            ipfs_msg, message, self._handle_get_task, task_data["requestId"]
-        )
+        self.send_message(ipfs_msg, message, self._handle_get_task, req_id)
+
+    def _has_pending_finalization(self) -> bool:
+        """Check if there is a task pending finalization, retrying the expired ones."""
+        req_id_to_data = self.params.req_id_to_data
+        for req_id in list(self._finalizing_reqs):
+            executing_task = req_id_to_data.get(req_id)
+            if executing_task is None or not executing_task.pending_finalization:
+                # the task has been finalized
+                self._finalizing_reqs.discard(req_id)
+                continue
+            if self._now > executing_task.finalization_timeout:
+                # the finalization has timed out, finalize the task as invalid
+                executing_task.is_invalid = True
+                executing_task.pending_finalization = False
+                self._finalizing_reqs.discard(req_id)
+                self._ready_queue.appendleft((req_id, None))
+                return False
+        return len(self._finalizing_reqs) > 0
+
+    def _finalize_next_task(self) -> None:
+        """Finalize the first task that is ready or has timed out, if any."""
+        while self._ready_queue:
+            req_id, future = self._ready_queue.popleft()
+            state, executing_task = self._classify(req_id)
+            if future is None:
+                is_ready = state == TaskState.INVALID
+            else:
+                is_ready = (
+                    state == TaskState.READY
+                    and cast(ExecutingTask, executing_task).async_result is future
+                )
+            if not is_ready:
+                # stale entry, the task has been finalized or re-enqueued
+                continue
+            task_output, serialized_response = self._get_executing_task_result(req_id)
+            self._handle_done_task(req_id, task_output, serialized_response)
+            self._mark_pending_finalization(req_id)
+            return
+
+        timeout_heap, now = self._timeout_heap, self._now
+        while timeout_heap and timeout_heap[0][0] <= now:
+            timeout_deadline, req_id = heapq.heappop(timeout_heap)
+            state, executing_task = self._classify(req_id)
+            # entries of tasks that have been finalized, re-enqueued or are ready are stale
+            if (
+                state == TaskState.TIMED_OUT
+                and cast(ExecutingTask, executing_task).timeout_deadline
+                == timeout_deadline
+            ):
+                self._handle_timeout_task(req_id)
+                self._mark_pending_finalization(req_id)
+                return
+
+    def _mark_pending_finalization(self, req_id: int) -> None:
+        """Mark a task as pending finalization, if it wasn't re-enqueued."""
+        executing_task = self.params.req_id_to_data.get(req_id)
+        if executing_task is None:
+            return
+        executing_task.pending_finalization = True
+        executing_task.finalization_timeout = self._now + 30
+        self._finalizing_reqs.add(req_id)
+
+    def _on_task_done(
+        self, req_id: int, task_id: Optional[int], future: Future
+    ) -> None:
+        """Mark the task as ready. Called from the executor's thread."""
+        if task_id is not None:
+            # the worker is not waiting for the task anymore, so its id can be reused
+            self._free_task_ids.append(task_id)
+        self._ready_queue.append((req_id, future))
+        self.params.wake_up.set()
 
     def send_message(
         self, msg: Message, dialogue: Dialogue, callback: Callable, req_id: int
     ) -> None:
         """Send message."""
         self.params.in_flight_req = True
-        self.params.in_flight_req_timeout = time.time() + 30
+        self.params.in_flight_req_timeout = self._now + 30
         self.context.outbox.put_message(message=msg)
         nonce = dialogue.dialogue_label.dialogue_reference[0]
         self.params.req_to_callback[nonce] = callback, req_id
 
-    def _handle_done_task(self, req_id: int, task_result: Any) -> None:
+    def _handle_done_task(
+        self,
+        req_id: int,
+        task_output: Optional[Tuple[Any, Any]],
+        serialized_response: Optional[str] = None,
+    ) -> None:
         """Handle done tasks"""
         executing_task = self.params.req_id_to_data[req_id]
-        request_id_nonce = executing_task.get("requestIdWithNonce", None)
-        mech_address = executing_task.get("contract_address", None)
-        tool = executing_task.get("tool", None)
-        model = executing_task.get("model", None)
-        tool_params = executing_task.get("params", None)
-        response = {"requestId": req_id, "result": "Invalid response"}
-        task_executor = self.context.agent_address
-        executing_task["done_task"] = {
-            "request_id": req_id,
-            "mech_address": mech_address,
-            "task_executor_address": task_executor,
-            "tool": tool,
-            "request_id_nonce": request_id_nonce,
-        }
-        if task_result is not None and len(task_result) == 5:
+        if task_output is not None:
             # task succeeded
-            deliver_msg, prompt, transaction, counter_callback, keychain = task_result
-            cost_dict = {}
-            if counter_callback is not None:
-                cost_dict = cast(TokenCounterCallback, counter_callback).cost_dict
-            metadata = {
-                "model": model,
-                "tool": tool,
-                "params": tool_params,
-            }
-            response = {
-                **response,
-                "result": deliver_msg,
-                "prompt": prompt,
-                "cost_dict": cost_dict,
-                "metadata": metadata,
-            }
-            executing_task["done_task"]["transaction"] = transaction
+            transaction, keychain = task_output
+            executing_task.transaction = transaction
 
             # update the keychain, it's possible that rotations happened
             # we want to use the most up-to-date key priority
             self._keychain = keychain
 
-        self.context.logger.info(f"Task result for request {req_id}: {task_result}")
+        if serialized_response is None:
+            # the response was not serialized by the worker, e.g., the task failed
+            serialized_response = serialize_response(
+                req_id, None, self._get_response_metadata(executing_task)
+            )
+        self.context.logger.info(
+            f"Task result for request {req_id}: {serialized_response}"
+        )
         msg, dialogue = self._build_ipfs_store_file_req(
-            {str(req_id): json.dumps(response)}
+            {str(req_id): serialized_response}
         )
         self.send_message(msg, dialogue, self._handle_store_response, req_id)
+        # compute the cost while the response is being stored
+        executing_task.cost = get_cost_for_done_task(
+            executing_task.to_done_task(self.context.agent_address)
+        )
+        self.context.logger.info(f"Cost for task {req_id}: {executing_task.cost}")
+
+    @staticmethod
+    def _get_response_metadata(executing_task: ExecutingTask) -> Dict[str, Any]:
+        """Get the metadata of a task response."""
+        return {
+            "model": executing_task.model,
+            "tool": executing_task.tool,
+            "params": executing_task.params,
+        }
 
-    def _restart_executor(self, idx: int) -> None:
-        """Restarts the executor."""
-        self._executor[idx].shutdown(wait=False)
+    def _create_executor(self) -> ProcessPoolExecutor:
+        """Create an executor, whose workers check for cancelled tasks."""
+        return ProcessPoolExecutor(
+            max_workers=self.params.max_executing_tasks,
+            initializer=AnyToolAsTask.init_worker,
+            initargs=(self._cancelled_tasks,),
+        )
+
+    def _restart_executor(self) -> ProcessPoolExecutor:
+        """Restarts the executor, returning the new one."""
+        cast(ProcessPoolExecutor, self._executor).shutdown(wait=False)
         # create a new executor
-        self._executor[idx] = ProcessPoolExecutor(max_workers=1)
+        self._executor = self._create_executor()
+        return self._executor
+
+    def _acquire_task_id(self) -> Optional[int]:
+        """Get an id that no task queued or running in the workers holds."""
+        if len(self._free_task_ids) == 0:
+            self.context.logger.warning(
+                "No free task id, the task won't be cancellable."
+            )
+            return None
+        task_id = self._free_task_ids.popleft()
+        cast(Any, self._cancelled_tasks)[task_id] = False
+        return task_id
+
+    def _cancel_task(self, task_id: int) -> None:
+        """Signal the worker running the task to stop waiting for it."""
+        cast(Any, self._cancelled_tasks)[task_id] = True
 
     def _handle_timeout_task(self, req_id: int) -> None:
         """Handle timeout tasks"""
         executing_task = self.params.req_id_to_data[req_id]
-        req_id = executing_task.get("requestId", None)
+        req_id = executing_task.request_id
         self.count_timeout(req_id)
         self.context.logger.info(f"Task timed out for request {req_id}")
         self.context.logger.info(
             f"Task {req_id} has timed out {self.request_id_to_num_timeouts[req_id]} times"
         )
-        async_result = executing_task.get("async_result", None)
-        if async_result is not None:
-            async_result.cancel()
-
-        # we restart the executor in case of a timeout.
-        # we do this because its possible the .cancel() call above is not respected
-        # by the executor. Since we only have 1 process running at a time, this would
-        # mean that the task being executed next would be queued. We want to avoid this.
-        executor_idx = executing_task["executor_idx"]
-        self._restart_executor(executor_idx)
+        async_result, task_id = executing_task.async_result, executing_task.task_id
+        if (
+            async_result is not None
+            and not async_result.cancel()
+            and task_id is not None
+        ):
+            # the .cancel() call above is not respected if the task is already running,
+            # which would keep one of the workers busy. Instead of restarting the executor,
+            # we signal the worker to stop waiting for the task, so that it remains usable.
+            # The tool itself can't be stopped, it keeps running in the background.
+            self._cancel_task(task_id)
 
         # check if we can add the task to the end of the queue
         if not self.timeout_limit_reached(req_id):
             # added to end of queue
             self.context.logger.info(f"Adding task {req_id} to the end of the queue")
-            self.pending_tasks.append({**executing_task, "pending_finalization": False})
+            # the request doesn't hold any execution state, so it can be re-used as is
+            self.pending_tasks.append(executing_task.request)
             self.params.req_id_to_data.pop(req_id, None)
             return None
 
@@ -451,47 +592,56 @@ class TaskExecutionBehaviour(SimpleBehaviour):
             None,
             None,
         )
-        self._handle_done_task(req_id, task_result)
+        serialized_response = serialize_response(
+            req_id, task_result, self._get_response_metadata(executing_task)
+        )
+        self._handle_done_task(req_id, None, serialized_response)
 
     def _handle_get_task(
         self, req_id: int, message: IpfsMessage, dialogue: Dialogue
     ) -> None:
         """Handle the response from ipfs for a task request."""
-        executing_task = cast(Dict[str, Any], self.params.req_id_to_data.get(req_id))
+        executing_task = self.params.req_id_to_data.get(req_id)
         if executing_task is None:
             self.context.logger.warning(f"Request ID {req_id} not found.")
             return
-        task_data = [json.loads(content) for content in message.files.values()][0]
-        is_data_valid = (
-            task_data
-            and isinstance(task_data, dict)
+        # only the first file holds the task's data
+        task_data = next(
+            (json.loads(content) for content in message.files.values()), None
+        )
+        if (
+            isinstance(task_data, dict)
             and "prompt" in task_data
             and "tool" in task_data
             and not self.params.clear_queue
-        )  # pylint: disable=C0301
-        if is_data_valid and task_data["tool"] in self._tools_to_file_hash:
-            self._prepare_task(req_id, task_data)
-        elif is_data_valid:
+        ):
             tool = task_data["tool"]
-            executing_task["tool"] = tool
-            self.context.logger.warning(f"Tool {tool} is not valid.")
-            executing_task["is_invalid"] = True
+            if tool in self._tools_to_file_hash:
+                self._prepare_task(req_id, task_data)
+            else:
+                executing_task.tool = tool
+                self.context.logger.warning(f"Tool {tool} is not valid.")
+                executing_task.is_invalid = True
+                self._ready_queue.append((req_id, None))
         else:
             self.context.logger.warning("Data for task is not valid.")
-            executing_task["is_invalid"] = True
+            executing_task.is_invalid = True
+            self._ready_queue.append((req_id, None))
+
+        # fill the next free worker right away, instead of waiting for the next tick
+        self._dispatch_next_task()
 
-    def _submit_task(
-        self, executor_idx: int, fn: Any, *args: Any, **kwargs: Any
-    ) -> Future:
+    def _submit_task(self, fn: Any, *args: Any, **kwargs: Any) -> Future:
         """Submit a task."""
+        executor = cast(ProcessPoolExecutor, self._executor)
         try:
-            return self._executor[executor_idx].submit(fn, *args, **kwargs)  # type: ignore
+            return executor.submit(fn, *args, **kwargs)
         except BrokenProcessPool:
             self.context.logger.warning("Executor is broken. Restarting...")
             # restart the executor
-            self._restart_executor(executor_idx)
+            executor = self._restart_executor()
             # try to run the task again
-            return self._executor.submit(executor_idx, fn, *args, **kwargs)  # type: ignore
+            return executor.submit(fn, *args, **kwargs)
 
     @property
     def task_deadline(self) -> float:
@@ -500,9 +650,9 @@ class TaskExecutionBehaviour(SimpleBehaviour):
         if self.params.max_queue_size < queue_size:
             # make the deadline smaller if the queue is full, do it according to the size
             denom = min(self.params.max_queue_size / queue_size, 5)
-            return time.time() + (self.params.task_deadline / denom)
+            return self._now + (self.params.task_deadline / denom)
 
-        return time.time() + self.params.task_deadline
+        return self._now + self.params.task_deadline
 
     def _prepare_task(self, req_id: int, task_data: Dict[str, Any]) -> None:
         """Prepare the task."""
@@ -516,18 +666,26 @@ class TaskExecutionBehaviour(SimpleBehaviour):
         task_data["model"] = task_data.get(
             "model", tool_params.get("default_model", None)
         )
-        executing_task = cast(Dict[str, Any], self.params.req_id_to_data[req_id])
+        executing_task = self.params.req_id_to_data[req_id]
+        executing_task.task_id = self._acquire_task_id()
+        task_data["task_id"] = executing_task.task_id
+        executing_task.tool = task_data["tool"]
+        executing_task.model = task_data["model"]
+        executing_task.params = tool_params
+        # the worker serializes the response as well, to keep it off the main thread
         future = self._submit_task(
-            executing_task["executor_idx"], tool_task.execute, **task_data
+            tool_task.execute_and_serialize,
+            req_id,
+            self._get_response_metadata(executing_task),
+            **task_data,
         )
-        executing_task["timeout_deadline"] = time.time() + self.task_deadline
-        executing_task["tool"] = task_data["tool"]
-        executing_task["model"] = task_data.get(
-            "model", tool_params.get("default_model", None)
+        executing_task.timeout_deadline = self.task_deadline
+        executing_task.async_result = future
+        heapq.heappush(self._timeout_heap, (executing_task.timeout_deadline, req_id))
+        # wake up the executor as soon as the task is done
+        future.add_done_callback(
+            functools.partial(self._on_task_done, req_id, executing_task.task_id)
         )
-        executing_task["params"] = tool_params
-        executing_task["async_result"] = future
-        self.params.req_id_to_data[req_id] = executing_task
 
     def _build_ipfs_message(
         self,
@@ -583,14 +741,11 @@ class TaskExecutionBehaviour(SimpleBehaviour):
         self, req_id: int, message: IpfsMessage, dialogue: Dialogue
     ) -> None:
         """Handle the response from ipfs for a store response request."""
-        executing_task = cast(Dict[str, Any], self.params.req_id_to_data.get(req_id))
+        executing_task = self.params.req_id_to_data.get(req_id)
         if executing_task is None:
             self.context.logger.warning(f"Request ID {req_id} not found.")
             return
-        req_id, sender = (
-            executing_task["requestId"],
-            executing_task["sender"],
-        )
+        req_id, sender = executing_task.request_id, executing_task.sender
         ipfs_hash = to_v1(message.ipfs_hash)
         self.context.logger.info(
             f"Response for request {req_id} stored on IPFS with hash {ipfs_hash}."
@@ -602,18 +757,16 @@ class TaskExecutionBehaviour(SimpleBehaviour):
         )
         # for health check metrics
         self.set_last_executed_task(req_id)
-        done_task = executing_task["done_task"]
         task_result = to_multihash(ipfs_hash)
-        cost = get_cost_for_done_task(done_task)
-        self.context.logger.info(f"Cost for task {req_id}: {cost}")
-        mech_config = self.params.mech_to_config[done_task["mech_address"]]
+        cost = cast(int, executing_task.cost)
+        mech_config = self.params.mech_to_config[cast(str, executing_task.mech_address)]
         if mech_config.use_dynamic_pricing:
             self.context.logger.info(f"Dynamic pricing is enabled for task {req_id}.")
-            task_result = encode(
-                ["uint256", "bytes"], [cost, bytes.fromhex(task_result)]
+            task_result = DYNAMIC_PRICING_ENCODER(
+                (cost, bytes.fromhex(task_result))
             ).hex()
 
-        done_task["task_result"] = task_result
+        done_task = executing_task.to_done_task(self.context.agent_address, task_result)
         # add to done tasks, in thread safe way
         with self.done_tasks_lock:
             self.done_tasks.append(done_task)
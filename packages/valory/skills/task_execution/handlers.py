@@ -20,7 +20,8 @@
 """This package contains a scaffold of a handler."""
 import threading
 import time
-from typing import Any, Dict, List, Optional, cast
+from collections import deque
+from typing import Any, Deque, Dict, Optional, cast
 
 from aea.protocols.base import Message
 from aea.skills.base import Handler
@@ -64,6 +65,11 @@ class BaseHandler(Handler):
         """Get the parameters."""
         return cast(Params, self.context.params)
 
+    def release_in_flight_req(self) -> None:
+        """Mark the in flight request as done and wake up the task executor."""
+        self.params.in_flight_req = False
+        self.params.wake_up.set()
+
     def teardown(self) -> None:
         """Teardown the handler."""
         self.context.logger.info(f"{self.__class__.__name__}: teardown called.")
@@ -106,17 +112,24 @@ class IpfsHandler(BaseHandler):
             self.context.logger.warning(
                 f"IPFS Message performative not recognized: {ipfs_msg.performative} {ipfs_msg.reason}"
             )
-            self.params.in_flight_req = False
+            self.release_in_flight_req()
             return
 
         try:
             dialogue = self.context.ipfs_dialogues.update(ipfs_msg)
             nonce = dialogue.dialogue_label.dialogue_reference[0]
             callback, req_id = self.params.req_to_callback.pop(nonce)
+        except Exception as e:
+            self.context.logger.error(f"Error handling IPFS message: {e}")
+            self.release_in_flight_req()
+            return
+
+        # release the request before the callback, as it may send the next one
+        self.release_in_flight_req()
+        try:
             callback(req_id, ipfs_msg, dialogue)
         except Exception as e:
             self.context.logger.error(f"Error handling IPFS message: {e}")
-        self.params.in_flight_req = False
 
 
 class ContractHandler(BaseHandler):
@@ -126,13 +139,13 @@ class ContractHandler(BaseHandler):
 
     def setup(self) -> None:
         """Setup the contract handler."""
-        self.context.shared_state[PENDING_TASKS] = []
+        self.context.shared_state[PENDING_TASKS] = deque()
         self.context.shared_state[DONE_TASKS] = []
         self.context.shared_state[DONE_TASKS_LOCK] = threading.Lock()
         super().setup()
 
     @property
-    def pending_tasks(self) -> List[Dict[str, Any]]:
+    def pending_tasks(self) -> Deque[Dict[str, Any]]:
         """Get pending_tasks."""
         return self.context.shared_state[PENDING_TASKS]
 
@@ -158,14 +171,14 @@ class ContractHandler(BaseHandler):
             self.context.logger.warning(
                 f"Contract API Message performative not recognized: {contract_api_msg.performative}"
             )
-            self.params.in_flight_req = False
+            self.release_in_flight_req()
             return
 
         body = contract_api_msg.state.body
         self._handle_get_undelivered_reqs(body)
         self.set_was_last_read_successful(True)
         self.on_message_handled(message)
-        self.params.in_flight_req = False
+        self.release_in_flight_req()
 
     def _handle_get_undelivered_reqs(self, body: Dict[str, Any]) -> None:
         """Handle get undelivered reqs."""
@@ -184,6 +197,7 @@ class ContractHandler(BaseHandler):
         current_tasks = set(
             [task["requestId"] for task in self.pending_tasks]
             + [task["request_id"] for task in self.context.shared_state[DONE_TASKS]]
+            + list(self.params.req_id_to_data)
         )
         reqs = [
             req
@@ -219,9 +233,9 @@ class LedgerHandler(BaseHandler):
             self.context.logger.warning(
                 f"Ledger API Message performative not recognized: {ledger_api_msg.performative}"
             )
-            self.params.in_flight_req = False
+            self.release_in_flight_req()
             return
         block_number = ledger_api_msg.state.body["number"]
         self.params.from_block = block_number - self.params.from_block_range
         self.on_message_handled(message)
-        self.params.in_flight_req = False
+        self.release_in_flight_req()
@@ -19,7 +19,9 @@
 
 """This module contains the shared state for the abci skill of Mech."""
 import dataclasses
+import threading
 from collections import defaultdict
+from concurrent.futures import Future
 from typing import Any, Callable, Dict, List, Optional, Tuple, cast
 
 from aea.exceptions import enforce
@@ -40,6 +42,64 @@ class MechConfig:
         )
 
 
+@dataclasses.dataclass(slots=True)
+class ExecutingTask:  # pylint: disable=too-many-instance-attributes
+    """A task that is being executed."""
+
+    # the request, as read from the mech contract
+    request: Dict[str, Any]
+    # the id of the task in the workers, set when the task is submitted
+    task_id: Optional[int] = None
+    tool: Optional[str] = None
+    model: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
+    async_result: Optional[Future] = None
+    timeout_deadline: Optional[float] = None
+    pending_finalization: bool = False
+    finalization_timeout: float = 0
+    is_invalid: bool = False
+    # the transaction returned by the tool, if the task succeeded
+    transaction: Optional[Any] = None
+    cost: Optional[int] = None
+
+    @property
+    def request_id(self) -> int:
+        """Get the request id."""
+        return self.request["requestId"]
+
+    @property
+    def request_id_nonce(self) -> Optional[int]:
+        """Get the request id with nonce."""
+        return self.request.get("requestIdWithNonce", None)
+
+    @property
+    def sender(self) -> str:
+        """Get the sender of the request."""
+        return self.request["sender"]
+
+    @property
+    def mech_address(self) -> Optional[str]:
+        """Get the address of the mech the request was made to."""
+        return self.request.get("contract_address", None)
+
+    def to_done_task(
+        self, task_executor_address: str, task_result: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Get the done task, as it is shared with the task submission skill."""
+        done_task: Dict[str, Any] = {
+            "request_id": self.request_id,
+            "mech_address": self.mech_address,
+            "task_executor_address": task_executor_address,
+            "tool": self.tool,
+            "request_id_nonce": self.request_id_nonce,
+        }
+        if self.transaction is not None:
+            done_task["transaction"] = self.transaction
+        if task_result is not None:
+            done_task["task_result"] = task_result
+        return done_task
+
+
 class Params(Model):
     """A model to represent params for multiple abci apps."""
 
@@ -55,6 +115,8 @@ class Params(Model):
 
         self.in_flight_req: bool = False
         self.in_flight_req_timeout: float = 0
+        # set whenever there may be new work for the task executor
+        self.wake_up: threading.Event = threading.Event()
         self.from_block: Optional[int] = None
         self.req_to_callback: Dict[str, Tuple[Callable, int]] = {}
         self.api_keys: Dict = self._nested_list_todict_workaround(
@@ -66,6 +128,11 @@ class Params(Model):
             kwargs,
             "file_hash_to_tools_json",
         )
+        self.file_hash_to_tools_inv: Dict[str, str] = {
+            tool: file_hash
+            for file_hash, tools in self.file_hash_to_tools.items()
+            for tool in tools
+        }
         self.polling_interval = kwargs.get("polling_interval", 30.0)
         self.task_deadline = kwargs.get("task_deadline", 240.0)
         self.num_agents = kwargs.get("num_agents", None)
@@ -85,7 +152,7 @@ class Params(Model):
         self.mech_to_config: Dict[str, MechConfig] = self._parse_mech_configs(kwargs)
         self.max_queue_size: int = kwargs.get("max_queue_size", 30)
         self.max_executing_tasks: int = kwargs.get("max_executing_tasks", 4)
-        self.req_id_to_data: Dict[int, Any] = {}
+        self.req_id_to_data: Dict[int, ExecutingTask] = {}
         self.clear_queue: bool = kwargs.get("clear_queue", False)
         super().__init__(*args, **kwargs)
 
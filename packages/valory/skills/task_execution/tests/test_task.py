@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the task utils of the task_execution skill."""
+
+import json
+import multiprocessing
+import threading
+from typing import Any, Generator
+
+import pytest
+
+from packages.valory.skills.task_execution.utils import task
+from packages.valory.skills.task_execution.utils.task import AnyToolAsTask
+
+
+TOOL_PY = """
+def run(**kwargs):
+    if kwargs.get("fail", False):
+        raise ValueError("the tool failed")
+    cancel = kwargs.get("cancel", None)
+    if cancel is not None:
+        cancel()
+        kwargs["release"].wait()
+    return "result"
+"""
+# a tool that echoes the names of its keyword arguments
+ECHO_TOOL_PY = """
+def run(**kwargs):
+    return ",".join(sorted(kwargs)), kwargs["prompt"], {"to": "0x"}, None, "keychain"
+"""
+TASK_ID = 1
+
+
+class TestAnyToolAsTask:
+    """Test the execution of the tools in the workers."""
+
+    @pytest.fixture(autouse=True)
+    def worker(self, monkeypatch: pytest.MonkeyPatch) -> Generator[None, None, None]:
+        """Initialize the worker with no cancelled tasks."""
+        monkeypatch.setattr(task, "CANCELLATION_CHECK_INTERVAL", 0.01)
+        AnyToolAsTask.init_worker(multiprocessing.RawArray("b", 3))
+        yield
+        AnyToolAsTask.cancelled_tasks = None
+        AnyToolAsTask.tool_namespaces = {}
+        AnyToolAsTask.abandoned_tools = []
+
+    @staticmethod
+    def cancel(task_id: int = TASK_ID) -> None:
+        """Cancel a task, as the agent does."""
+        AnyToolAsTask.cancelled_tasks[task_id] = True  # type: ignore
+
+    @staticmethod
+    def execute(**kwargs: Any) -> Any:
+        """Execute the test tool."""
+        return AnyToolAsTask().execute(
+            tool_py=TOOL_PY, callable_method="run", task_id=TASK_ID, **kwargs
+        )
+
+    def test_result(self) -> None:
+        """Test that the result of a tool that is not cancelled is returned."""
+        self.cancel(TASK_ID + 1)
+        assert self.execute() == "result"
+        assert AnyToolAsTask.abandoned_tools == []
+
+    def test_exception(self) -> None:
+        """Test that the exception of a tool is raised in the worker."""
+        with pytest.raises(ValueError, match="the tool failed"):
+            self.execute(fail=True)
+
+    def test_cancelled_while_running(self) -> None:
+        """Test that the worker stops waiting for a tool that gets cancelled."""
+        release = threading.Event()
+        try:
+            assert self.execute(cancel=self.cancel, release=release) is None
+            (thread,) = AnyToolAsTask.abandoned_tools
+            assert thread.is_alive()
+        finally:
+            release.set()
+        thread.join(1)
+        assert not thread.is_alive()
+
+    def test_cancelled_while_queued(self) -> None:
+        """Test that a tool that got cancelled before it started is not run."""
+        self.cancel()
+        assert self.execute(fail=True) is None
+        assert AnyToolAsTask.abandoned_tools == []
+
+    def test_tool_loaded_once(self) -> None:
+        """Test that the source of a tool is only executed once per worker."""
+        self.execute()
+        namespace = AnyToolAsTask.tool_namespaces[TOOL_PY]
+        self.execute()
+        assert AnyToolAsTask.load_tool(TOOL_PY) is namespace
+
+    def test_request_keys_do_not_collide(self) -> None:
+        """Test that the keys of a request can have the names of the worker's parameters."""
+        task_output, serialized_response = AnyToolAsTask().execute_and_serialize(
+            1,
+            {"tool": "echo"},
+            tool_py=ECHO_TOOL_PY,
+            callable_method="run",
+            prompt="prompt",
+            req_id=2,
+            metadata="metadata",
+            self="self",
+        )
+        assert task_output == ({"to": "0x"}, "keychain")
+        response = json.loads(serialized_response)
+        assert response["requestId"] == 1
+        assert response["metadata"] == {"tool": "echo"}
+        assert response["result"] == "metadata,prompt,req_id,self"
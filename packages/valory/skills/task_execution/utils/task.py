@@ -19,17 +19,137 @@
 
 """This package contains a custom Loader for the ipfs connection."""
 
-from typing import Any
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from packages.valory.skills.task_execution import PUBLIC_ID
+
+
+_logger = logging.getLogger(
+    f"aea.packages.{PUBLIC_ID.author}.skills.{PUBLIC_ID.name}.utils.task"
+)
+
+
+# how often a running tool checks whether it has been cancelled, in seconds
+CANCELLATION_CHECK_INTERVAL = 1.0
+
+
+def serialize_response(req_id: int, task_result: Any, metadata: Dict[str, Any]) -> str:
+    """Serialize the response of a task, as it is stored on IPFS."""
+    response = {"requestId": req_id, "result": "Invalid response"}
+    if task_result is not None and len(task_result) == 5:
+        # task succeeded
+        deliver_msg, prompt, _transaction, counter_callback, _keychain = task_result
+        cost_dict = {}
+        if counter_callback is not None:
+            cost_dict = counter_callback.cost_dict
+        response = {
+            **response,
+            "result": deliver_msg,
+            "prompt": prompt,
+            "cost_dict": cost_dict,
+            "metadata": metadata,
+        }
+    return json.dumps(response)
 
 
 class AnyToolAsTask:
     """AnyToolAsTask"""
 
-    def execute(self, *args: Any, **kwargs: Any) -> Any:
+    # whether each task id has been cancelled, shared by the agent with the worker processes.
+    # The agent doesn't give the same id to two tasks that are queued or running at once
+    cancelled_tasks: Optional[Any] = None
+    # the threads of the cancelled tools that are still running in the worker process
+    abandoned_tools: List[threading.Thread] = []
+    # the namespaces of the tools loaded by the worker process, by their source, so that
+    # their module level state, e.g., caches and clients, is kept across tasks
+    tool_namespaces: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def init_worker(cls, cancelled_tasks: Any) -> None:
+        """Initialize a worker process with the ids of the cancelled tasks."""
+        cls.cancelled_tasks = cancelled_tasks
+
+    @classmethod
+    def is_cancelled(cls, task_id: int) -> bool:
+        """Check if the task has been cancelled."""
+        if cls.cancelled_tasks is None:
+            return False
+        return bool(cls.cancelled_tasks[task_id])
+
+    @classmethod
+    def load_tool(cls, tool_py: str) -> Dict[str, Any]:
+        """Load a tool, only executing its source the first time the worker runs it."""
+        local_namespace = cls.tool_namespaces.get(tool_py, None)
+        if local_namespace is None:
+            local_namespace = {}
+            exec(tool_py, local_namespace)  # pylint: disable=W0122  # nosec
+            cls.tool_namespaces[tool_py] = local_namespace
+        return local_namespace
+
+    @classmethod
+    def abandon_tool(cls, thread: threading.Thread) -> None:
+        """Stop waiting for the thread of a cancelled tool, which can't be stopped."""
+        cls.abandoned_tools = [
+            tool for tool in cls.abandoned_tools if tool.is_alive()
+        ] + [thread]
+        _logger.warning(
+            f"{len(cls.abandoned_tools)} cancelled tools are still running in the worker."
+        )
+
+    def execute(self, /, *args: Any, **kwargs: Any) -> Any:
         """Execute the task."""
         tool_py = kwargs.pop("tool_py")
         callable_method = kwargs.pop("callable_method")
-        local_namespace: Any = {}
-        exec(tool_py, local_namespace)  # pylint: disable=W0122  # nosec
-        method = local_namespace[callable_method]
-        return method(*args, **kwargs)
+        task_id = kwargs.pop("task_id", None)
+        method = self.load_tool(tool_py)[callable_method]
+        if task_id is None or self.cancelled_tasks is None:
+            return method(*args, **kwargs)
+        if self.is_cancelled(task_id):
+            # the task was cancelled while it was queued
+            return None
+
+        # run the tool in a separate thread, so that the worker can stop waiting for it
+        # and pick up the next task, in case the task gets cancelled
+        outcome: Dict[str, Any] = {}
+
+        def run() -> None:
+            """Run the tool and store its outcome."""
+            try:
+                outcome["result"] = method(*args, **kwargs)
+            except Exception as e:  # pylint: disable=broad-except
+                outcome["exception"] = e
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        while thread.is_alive():
+            thread.join(CANCELLATION_CHECK_INTERVAL)
+            if thread.is_alive() and self.is_cancelled(task_id):
+                self.abandon_tool(thread)
+                return None
+        if "exception" in outcome:
+            raise outcome["exception"]
+        return outcome.get("result", None)
+
+    def execute_and_serialize(
+        self, req_id: int, metadata: Dict[str, Any], /, *args: Any, **kwargs: Any
+    ) -> Tuple[Optional[Tuple[Any, Any]], str]:
+        """
+        Execute the task and serialize its response, so that the agent doesn't have to.
+
+        The parameters are positional only, as the keyword arguments come from the request.
+
+        :param req_id: the id of the request.
+        :param metadata: the metadata of the response.
+        :param args: the positional arguments of the tool.
+        :param kwargs: the keyword arguments of the tool, along with the tool itself.
+        :return: the transaction and the keychain of a successful task, and the serialized response.
+        """
+        task_result = self.execute(*args, **kwargs)
+        serialized_response = serialize_response(req_id, task_result, metadata)
+        if task_result is None or len(task_result) != 5:
+            return None, serialized_response
+        _deliver_msg, _prompt, transaction, _counter_callback, keychain = task_result
+        return (transaction, keychain), serialized_response
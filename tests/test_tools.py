@@ -17,8 +17,11 @@
 #
 # ------------------------------------------------------------------------------
 """This module contains tool tests."""
+import json
 from typing import List, Any
 
+import pytest
+
 from packages.gnosis.customs.omen_tools import omen_buy_sell
 from packages.victorpolisetty.customs.dalle_request import dalle_request
 from packages.napthaai.customs.prediction_request_rag import prediction_request_rag
@@ -181,6 +184,78 @@ class TestOmenTransactionBuilder(BaseToolTest):
         assert len(response[2].keys()) == expected_num_tx_params
 
 
+class TestOmenParseParamsFromPrompt:
+    """Test the deterministic parsing of the omen tool params."""
+
+    sender = "0x669F3CD2015eB9298b3feA01FCBb034068FE2D3f"
+    market_id = "0x7323440218011988f0e431e19298d1921e41197f"
+
+    def test_well_formed_prompt(self) -> None:
+        """Test that a well-formed prompt is parsed without the LLM."""
+        params = omen_buy_sell.parse_params_from_prompt(
+            f"The sender {self.sender} wants to buy 1 yes Tokens from market {self.market_id}."
+        )
+        assert params == omen_buy_sell.BuyOrSell(
+            sender=self.sender,
+            market_id=self.market_id,
+            outcome=True,
+            amount_to_buy=1.0,
+        )
+
+    def test_amount_in_xdai(self) -> None:
+        """Test that an amount given in xDAI is parsed."""
+        params = omen_buy_sell.parse_params_from_prompt(
+            f"Sell no tokens for 0.5 xDAI, sender: {self.sender}, market: {self.market_id}"
+        )
+        assert params is not None
+        assert params.outcome is False
+        assert params.amount_to_buy == 0.5
+
+    def test_json_prompt(self) -> None:
+        """Test that a JSON prompt is parsed."""
+        params = omen_buy_sell.parse_params_from_prompt(
+            json.dumps(
+                {
+                    "sender": self.sender,
+                    "market_id": self.market_id,
+                    "outcome": False,
+                    "amount_to_buy": 2,
+                }
+            )
+        )
+        assert params is not None
+        assert params.amount_to_buy == 2.0
+
+    @pytest.mark.parametrize(
+        "prompt",
+        [
+            # the market address follows the sender label
+            f"The sender wants to buy from market {market_id}, sender address {sender}, 1 yes",
+            # the only number is not an amount
+            f"The sender {sender} wants to buy yes tokens in market {market_id} that resolves in 3 days",
+            # negative amounts are not supported
+            f"The sender {sender} wants to buy -1 yes tokens from market {market_id}",
+            # conflicting outcomes
+            f"The sender {sender} wants to buy 1 yes or no tokens from market {market_id}",
+            # conflicting amounts
+            f"The sender {sender} wants to buy 1 yes tokens for 2 xDAI from market {market_id}",
+            # the sender and the market are the same
+            f"The sender {sender} wants to buy 1 yes tokens from market {sender}",
+            # missing market
+            f"The sender {sender} wants to buy 1 yes tokens",
+            # digit group separators are ambiguous
+            f"The sender {sender} wants to buy 1,000 yes Tokens from market {market_id}",
+            f"The sender {sender} wants to buy yes tokens for 1,000 xDAI from market {market_id}",
+            # the market id is not an address
+            f"The sender {sender} wants to buy 1 yes tokens from market {market_id}abcd",
+            f"The sender {sender} wants to buy 1 yes tokens from market {market_id[:-2]}",
+        ],
+    )
+    def test_ambiguous_prompt(self, prompt: str) -> None:
+        """Test that ambiguous prompts are left to the LLM."""
+        assert omen_buy_sell.parse_params_from_prompt(prompt) is None
+
+
 class TestDALLEGeneration(BaseToolTest):
     """Test DALL-E Generation."""
 